@@ -1,14 +1,77 @@
 import os
 import ee
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 import math
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
+import json
+import time
+import hashlib
+import zlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional: faster (Rust-based) JSON encoding of the streamed response stages.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional: simplifying user-drawn AOIs before they are sent to Earth Engine.
+try:
+    from shapely.geometry import Polygon as ShapelyPolygon
+except ImportError:
+    ShapelyPolygon = None
+
+# Optional: reading class areas from a precomputed suitability COG needs rio-tiler.
+# Without it (or without SUITABILITY_COG_URI set) every AOI is analysed in Earth Engine.
+try:
+    from rio_tiler.io import Reader as COGReader
+except ImportError:
+    COGReader = None
+
+class PooledHttpTransport:
+    """httplib2.Http-compatible transport for the Earth Engine client backed by a pooled requests.Session.
+       Keep-alive connections are shared across threads, so concurrent getInfo()/getMapId() calls reuse
+       open TLS connections instead of repeating the handshake."""
+
+    def __init__(self, pool_connections=32, pool_maxsize=64, timeout=(10, 300)):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # (connect, read) seconds; the read timeout matches EE's 5 minute limit for interactive computations,
+        # so a hung connection can't hold an executor worker forever
+        self.timeout = timeout
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        """Performs a request and returns (httplib2.Response, content bytes) like httplib2.Http.request.
+           requests exceptions are converted to the builtin ConnectionError/TimeoutError (as EE's own
+           transport does), which googleapiclient treats as transient and retries."""
+        try:
+            response = self.session.request(method, uri, data=body, headers=headers,
+                                            timeout=self.timeout, allow_redirects=redirections > 0)
+        except requests.exceptions.Timeout as e: # Checked first: ConnectTimeout is also a ConnectionError
+            raise TimeoutError(e) from e
+        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+            raise ConnectionError(e) from e
+        info = dict(response.headers)
+        info.pop('Content-Encoding', None) # requests already decoded the body
+        info['status'] = str(response.status_code)
+        return httplib2.Response(info), response.content
 
 # Initialize Earth Engine
 # Ensure you have authenticated using `ee.Authenticate()` and then `ee.Initialize()`
 # If you are deploying, consider using service account authentication for production.
 try:
     # IMPORTANT: Replace 'ee-sachinbobbili' with your actual Earth Engine project ID.
-    ee.Initialize(project='ee-sachinbobbili') 
+    # The high-volume endpoint is provisioned for programmatic, concurrent requests like ours
+    # (getMapId, getInfo, reduceRegion) rather than interactive Code Editor use.
+    ee.Initialize(project='ee-sachinbobbili', url='https://earthengine-highvolume.googleapis.com',
+                  http_transport=PooledHttpTransport())
     print("Earth Engine initialized successfully.")
 except Exception as e:
     print(f"FATAL: Earth Engine Initialization Failed: {e}")
@@ -16,6 +79,22 @@ except Exception as e:
 
 app = Flask(__name__)
 
+# Thread pools for blocking Earth Engine calls, reused across requests. The EE client is synchronous and
+# network-bound, so threads release the GIL while waiting on the server. Tile-URL requests (getMapId, fast)
+# and the batched statistics (getInfo, often several seconds) get separate pools, so a new request's
+# map layers never queue behind other users' statistics.
+MAP_ID_MAX_WORKERS = 16 # Two getMapId calls per analysis
+STATS_MAX_WORKERS = 16 # One batched getInfo per analysis
+map_id_executor = ThreadPoolExecutor(max_workers=MAP_ID_MAX_WORKERS, thread_name_prefix='ee-mapid')
+stats_executor = ThreadPoolExecutor(max_workers=STATS_MAX_WORKERS, thread_name_prefix='ee-stats')
+
+# reduceRegion settings shared by all statistics. No bestEffort: an AOI over the pixel budget fails loudly
+# instead of being silently downscaled. 1e9 pixels of (100 m)^2 at the area scale is 1e13 m^2 = ~10^7 km^2
+# (more at the 500 m stats scale), so only continent-sized AOIs hit the limit.
+# tileScale=4 splits the work into smaller tiles for better parallelism on the EE backend.
+REDUCER_MAX_PIXELS = 1e9
+REDUCER_TILE_SCALE = 4
+
 # Helper function to convert GEE object to Python number with error handling
 # This function is now more carefully used only when we expect an EE Number object.
 def ee_number_to_float(ee_object):
@@ -31,6 +110,333 @@ def ee_number_to_float(ee_object):
             return None
     return None
 
+# In-memory cache of analysis results, keyed by a hash of the AOI coordinates.
+# Tile URLs returned by Earth Engine are signed but stay valid for hours, so a one hour TTL is safe.
+ANALYSIS_CACHE_MAXSIZE = 256
+ANALYSIS_CACHE_TTL_SECONDS = 3600
+AOI_KEY_PRECISION = 6 # Decimal places kept when hashing coordinates (~0.1 m)
+_analysis_cache = OrderedDict() # key -> (expiry timestamp, list of response stage dicts), oldest first
+_analysis_cache_lock = threading.Lock()
+
+def is_valid_aoi_coords(aoi_coords):
+    """Checks that AOI coordinates are a list of rings, each with at least 4 finite [lon, lat] points."""
+    def is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+    if not isinstance(aoi_coords, list) or not aoi_coords:
+        return False
+    for ring in aoi_coords:
+        if not isinstance(ring, list) or len(ring) < 4:
+            return False
+        for point in ring:
+            if not isinstance(point, (list, tuple)) or len(point) < 2 or not all(is_number(v) for v in point):
+                return False
+    return True
+
+def aoi_cache_key(aoi_coords):
+    """Builds a stable cache key for AOI coordinates, rounded to a fixed precision."""
+    def _round(value):
+        if isinstance(value, (list, tuple)):
+            return [_round(v) for v in value]
+        return round(value, AOI_KEY_PRECISION)
+    payload = json.dumps(_round(aoi_coords), sort_keys=True).encode()
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+def get_cached_analysis(key):
+    """Returns the cached response stages for a key, or None if missing or expired."""
+    with _analysis_cache_lock:
+        entry = _analysis_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, response_stages = entry
+        if expires_at < time.monotonic():
+            del _analysis_cache[key]
+            return None
+        _analysis_cache.move_to_end(key) # Mark as most recently used
+        return response_stages
+
+def cache_analysis(key, response_stages):
+    """Stores the response stages, evicting the least recently used entry when full."""
+    with _analysis_cache_lock:
+        _analysis_cache[key] = (time.monotonic() + ANALYSIS_CACHE_TTL_SECONDS, response_stages)
+        _analysis_cache.move_to_end(key)
+        while len(_analysis_cache) > ANALYSIS_CACHE_MAXSIZE:
+            _analysis_cache.popitem(last=False)
+
+# Per-tile cache of suitability class areas (km^2) for map tiles lying entirely inside an AOI.
+# Tile values only depend on the static global datasets, so they are reused across users and AOIs.
+TILE_CACHE_ZOOM = 10 # Web-mercator zoom level of the tile grid (~39 km tiles at the equator)
+TILE_CACHE_MAXSIZE = 100000
+_tile_area_cache = OrderedDict() # "cell:z:x:y" -> {class name: area km^2}, oldest first
+_tile_area_cache_lock = threading.Lock()
+
+def lonlat_to_tile(lon, lat, zoom):
+    """Returns the (x, y) web-mercator tile indices containing a lon/lat point."""
+    n = 2 ** zoom
+    lat = max(min(lat, 85.0511), -85.0511) # Clamp to the web-mercator latitude range
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tiles_inside_aoi(aoi_coords, zoom=TILE_CACHE_ZOOM):
+    """Returns {tile key: (west, south, east, north)} for tiles lying entirely inside the AOI polygon.
+       Tiles crossed by the AOI boundary are left out and handled by the regular per-AOI reduction.
+       Vectorized over all candidate tiles: a tile is inside if no ring edge touches it and its center is
+       inside the polygon (even-odd rule over the outer ring and holes)."""
+    rings = [np.asarray(ring, dtype=np.float64)[:, :2] for ring in aoi_coords if ring]
+    if not rings:
+        return {}
+    # Ring edges (outer ring and holes) as start/end coordinate arrays
+    starts = np.concatenate(rings)
+    ends = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings])
+    min_x, min_y = lonlat_to_tile(starts[:, 0].min(), starts[:, 1].max(), zoom) # Tile y grows southwards
+    max_x, max_y = lonlat_to_tile(starts[:, 0].max(), starts[:, 1].min(), zoom)
+
+    # Bounds of every candidate tile in the AOI's bounding box
+    xs, ys = np.meshgrid(np.arange(min_x, max_x + 1), np.arange(min_y, max_y + 1), indexing='ij')
+    xs, ys = xs.ravel(), ys.ravel()
+    n = 2 ** zoom
+    west, east = xs / n * 360.0 - 180.0, (xs + 1) / n * 360.0 - 180.0
+    north = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * ys / n))))
+    south = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (ys + 1) / n))))
+    center_x, center_y = (west + east) / 2, (south + north) / 2
+    corners = [(west, south), (east, south), (east, north), (west, north)]
+
+    crossed = np.zeros(len(xs), dtype=bool)
+    center_inside = np.zeros(len(xs), dtype=bool)
+    block = max(1, 1000000 // len(xs)) # Edges per block, bounding the (edges x tiles) temporaries
+    for i in range(0, len(starts), block):
+        x1, y1 = starts[i:i + block, 0, None], starts[i:i + block, 1, None]
+        x2, y2 = ends[i:i + block, 0, None], ends[i:i + block, 1, None]
+        dx, dy = x2 - x1, y2 - y1
+        # An edge touches a tile if their bounding boxes overlap and the tile's corners are not all strictly
+        # on one side of the edge's line (separating axis test); touching counts, to stay conservative
+        overlap = (np.minimum(x1, x2) <= east) & (np.maximum(x1, x2) >= west) & \
+                  (np.minimum(y1, y2) <= north) & (np.maximum(y1, y2) >= south)
+        sides = [dx * (cy - y1) - dy * (cx - x1) for cx, cy in corners]
+        separated = np.logical_and.reduce([side > 0 for side in sides]) | \
+                    np.logical_and.reduce([side < 0 for side in sides])
+        crossed |= (overlap & ~separated).any(axis=0)
+        # Even-odd ray casting from each tile center
+        straddles = (y1 > center_y) != (y2 > center_y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing_x = x1 + dx * (center_y - y1) / dy
+        center_inside ^= ((straddles & (center_x < crossing_x)).sum(axis=0) % 2).astype(bool)
+
+    # With no edge touching the tile, the whole tile is on the same side of the boundary as its center
+    inside = center_inside & ~crossed
+    return {
+        f"cell:{zoom}:{x}:{y}": (w, s, e, nb)
+        for x, y, w, s, e, nb in zip(xs[inside].tolist(), ys[inside].tolist(), west[inside].tolist(),
+                                     south[inside].tolist(), east[inside].tolist(), north[inside].tolist())
+    }
+
+def get_cached_tile_areas(tile_keys):
+    """Returns {tile key: class areas} for the tile keys already present in the tile cache."""
+    with _tile_area_cache_lock:
+        hits = {}
+        for key in tile_keys:
+            if key in _tile_area_cache:
+                _tile_area_cache.move_to_end(key)
+                hits[key] = _tile_area_cache[key]
+        return hits
+
+def cache_tile_areas(tile_areas):
+    """Stores {tile key: class areas} in the tile cache, evicting the least recently used tiles when full."""
+    with _tile_area_cache_lock:
+        for key, areas in tile_areas.items():
+            _tile_area_cache[key] = areas
+            _tile_area_cache.move_to_end(key)
+        while len(_tile_area_cache) > TILE_CACHE_MAXSIZE:
+            _tile_area_cache.popitem(last=False)
+
+# Suitability class names, indexed by class value - 1 (matching frontend chart labels)
+SUITABILITY_CLASS_NAMES = ['Most Suitable', 'Medium Suitable', 'Less Suitable', 'Not Suitable']
+
+def build_suitability_layers():
+    """Builds the elevation, slope and suitability (1-4) images from the global source datasets.
+       The layers are not clipped to any AOI: reductions are bounded by their own geometry, which keeps
+       per-tile results AOI-independent and lets the same image be exported as a precomputed COG."""
+    # 1. Elevation Data and Classification
+    elevation = SRTM_ELEVATION
+
+    # Classification layers are built directly from the source images without a fixed-scale reproject(),
+    # so Earth Engine computes them at the scale requested by each reducer or map tile.
+    # unmask(0) keeps the 0 class where a source image has no data.
+
+    # Classify elevation: 1 for (30m < elevation < 2000m)
+    dem_class = elevation.lt(2000).And(elevation.gt(30)).unmask(0)
+
+    # 2. Slope Data and Classification
+    slope = ee.Terrain.slope(elevation)
+    # Classify slope: 1 for <5 deg, 0.6 for 5-10 deg (and elevation < 10m), 0.4 for >10 deg
+    slope_class = slope.lt(5).toFloat().where(
+        (slope.gt(5).And(elevation.lt(10))), 0.6 # Original script had OR, re-checked and updated to AND for consistency with logic
+    ).where(
+        (slope.gt(10)), 0.4
+    ).unmask(0)
+
+    # 3. Land Use/Land Cover (LULC) Data and Classification
+    # Using ESA WorldCover v200, which has a 'Map' band for LULC classes
+    lulc = WORLDCOVER
+
+    # WorldCover classes: 20=Shrubland, 60=Barren/Sparse Vegetation
+    # Classify LULC: 1 for Shrubland or Barren/Sparse Vegetation
+    class_lulc = lulc.eq(20).Or(lulc.eq(60)).unmask(0)
+
+    # Suitability Overlay: Combine classifications
+    # Sum the classified layers. A value of 3 means all three criteria (DEM, Slope, LULC) are met.
+    suitability_raw = dem_class.add(slope_class).add(class_lulc)
+
+    # Reclassify raw suitability scores into discrete suitability levels (1-4) with a single lookup:
+    # 3 -> 1, 2.6 -> 2, 2.4 -> 3, anything else (< 2.4) -> 4.
+    # Scores are scaled by 10 and rounded so remap() can match them as integers.
+    # Every pixel is classed 1-4 after the remap (the inputs are unmasked to 0), so no mask is needed.
+    suitability = suitability_raw.multiply(10).round().toInt().remap([30, 26, 24], [1, 2, 3], 4)
+
+    return elevation, slope, suitability
+
+# Static dataset references and the AOI-independent layers derived from them, built once at import so
+# every request reuses the same computation-graph prefix instead of reconstructing it.
+if ee is not None:
+    SRTM_ELEVATION = ee.Image('USGS/SRTMGL1_003').select('elevation')
+    WORLDCOVER = ee.ImageCollection('ESA/WorldCover/v200').first() # Get the first image (often the latest)
+    PIXEL_AREA_KM2 = ee.Image.pixelArea().divide(1000 * 1000) # pixelArea() returns m^2
+    SOLAR_RADIATION = ee.ImageCollection("ECMWF/ERA5_LAND/DAILY_AGGR") \
+                        .filterDate('2024-01-01', '2024-12-31') \
+                        .mean() \
+                        .select("surface_solar_radiation_downwards_sum")
+    ELEVATION, SLOPE, SUITABILITY = build_suitability_layers()
+    # Reducers are AOI-independent too: min/max/mean for terrain stats, sum for class areas
+    TERRAIN_STATS_REDUCER = ee.Reducer.minMax().combine(ee.Reducer.mean(), sharedInputs=True)
+    AREA_SUM_REDUCER = ee.Reducer.sum()
+
+# Precomputed suitability layer exported as a Cloud-Optimized GeoTIFF (see export_suitability_cog),
+# e.g. 'gs://my-bucket/suitability.tif'. AOIs fully inside its extent skip the EE area reduction.
+SUITABILITY_COG_URI = os.environ.get('SUITABILITY_COG_URI')
+EARTH_RADIUS_KM = 6371.0088 # Mean Earth radius used for per-pixel area in the COG's lon/lat grid
+# Largest native-resolution read (pixels) served from the COG; about 1.5 x 1.5 degrees at 30 m.
+# Larger AOIs fall back to Earth Engine, which reduces them server-side at 100 m.
+COG_MAX_PIXELS = 25e6
+
+def export_suitability_cog(region_bbox, bucket, file_name_prefix='suitability', scale=30):
+    """Starts a one-time EE batch export of the suitability layer (1-4, uint8) as a COG in EPSG:4326.
+       region_bbox is [west, south, east, north]. Returns the started ee.batch.Task.
+       Example: python -c "import app; app.export_suitability_cog([68, 6, 98, 36], 'my-bucket')"
+    """
+    task = ee.batch.Export.image.toCloudStorage(
+        image=SUITABILITY.toUint8(),
+        description='suitability_cog',
+        bucket=bucket,
+        fileNamePrefix=file_name_prefix,
+        region=ee.Geometry.Rectangle(region_bbox, geodesic=False),
+        scale=scale,
+        crs='EPSG:4326',
+        maxPixels=1e13,
+        fileFormat='GeoTIFF',
+        formatOptions={'cloudOptimized': True}
+    )
+    task.start()
+    print(f"DEBUG: Started suitability COG export task {task.id} to gs://{bucket}/{file_name_prefix}.")
+    return task
+
+def cog_class_areas(aoi_coords):
+    """Returns {class name: area km^2} for the AOI read from the precomputed suitability COG,
+       or None if the COG is not configured/available, is not in a geographic CRS, does not fully cover
+       the AOI, or the AOI would need more than COG_MAX_PIXELS pixels at the COG's native resolution."""
+    if COGReader is None or not SUITABILITY_COG_URI:
+        return None
+    min_lon, min_lat, max_lon, max_lat = aoi_bbox(aoi_coords)
+    try:
+        with COGReader(SUITABILITY_COG_URI) as cog:
+            if not cog.crs.is_geographic:
+                return None # The per-row cos(lat) pixel area below assumes a lon/lat grid
+            west, south, east, north = cog.geographic_bounds
+            if min_lon < west or max_lon > east or min_lat < south or max_lat > north:
+                return None # AOI (partly) outside the precomputed extent: fall back to Earth Engine
+            res_x, res_y = cog.dataset.res
+            if (max_lon - min_lon) / res_x * (max_lat - min_lat) / res_y > COG_MAX_PIXELS:
+                return None # Too large to read at native resolution in the web process: use Earth Engine
+            feature = {'type': 'Feature', 'properties': {}, 'geometry': {'type': 'Polygon', 'coordinates': aoi_coords}}
+            image = cog.feature(feature, dst_crs=cog.crs, max_size=None) # Native resolution, pixels outside AOI masked
+    except Exception as e:
+        print(f"WARNING: Could not read suitability COG, falling back to Earth Engine: {e}")
+        return None
+
+    classes = image.array[0] # Masked array (rows, cols) of suitability classes 1-4
+    img_west, img_south, img_east, img_north = image.bounds
+    rows, cols = classes.shape
+    lon_res = math.radians((img_east - img_west) / cols)
+    lat_res = math.radians((img_north - img_south) / rows)
+    # Pixel area shrinks with latitude in a lon/lat grid: R^2 * dlon * dlat * cos(lat) for each row
+    row_lats = np.radians(img_north - (np.arange(rows) + 0.5) * (img_north - img_south) / rows)
+    row_area_km2 = EARTH_RADIUS_KM ** 2 * lon_res * lat_res * np.cos(row_lats)
+
+    # Pixel area only varies by row, so count pixels per (row, class) in a single bincount pass and weight
+    # the per-row counts afterwards, instead of building a per-pixel area raster. Pixels outside the AOI
+    # are mapped to class 0, which avoids boolean-mask copies; bin 0 is simply ignored.
+    cls = classes.filled(0).astype(np.uint8, copy=False)
+    counts = np.bincount((np.arange(rows)[:, None] * 5 + cls).ravel(), minlength=rows * 5).reshape(rows, 5)
+    areas = row_area_km2 @ counts
+    return {name: float(areas[class_value]) for class_value, name in enumerate(SUITABILITY_CLASS_NAMES, start=1)}
+
+def aoi_bbox(aoi_coords):
+    """Returns (min_lon, min_lat, max_lon, max_lat) of the AOI's outer ring."""
+    pts = np.asarray(aoi_coords[0], dtype=np.float64)[:, :2]
+    (min_lon, min_lat), (max_lon, max_lat) = pts.min(axis=0).tolist(), pts.max(axis=0).tolist()
+    return min_lon, min_lat, max_lon, max_lat
+
+def aoi_centroid(aoi_coords):
+    """Returns (lon, lat) of the AOI's outer ring as the mean of its unique vertices
+       (the closing point of a GeoJSON ring repeats the first one)."""
+    pts = np.asarray(aoi_coords[0], dtype=np.float64)[:, :2]
+    if len(pts) > 1 and (pts[0] == pts[-1]).all():
+        pts = pts[:-1]
+    center_lon, center_lat = pts.mean(axis=0).tolist()
+    return center_lon, center_lat
+
+def ndjson_line(payload):
+    """Serializes one response stage as a newline-delimited JSON line (bytes), using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(payload) + '\n').encode()
+
+AOI_SIMPLIFY_TOLERANCE = 1e-4 # Degrees (~11 m), well below the 30-100 m analysis scale
+
+def simplify_aoi_coords(aoi_coords, tolerance=AOI_SIMPLIFY_TOLERANCE):
+    """Drops AOI vertices that move the outline by less than the tolerance, keeping the topology valid.
+       Returns the coordinates unchanged if shapely is not installed or simplification fails."""
+    if ShapelyPolygon is None:
+        return aoi_coords
+    try:
+        polygon = ShapelyPolygon(aoi_coords[0], aoi_coords[1:]).simplify(tolerance, preserve_topology=True)
+    except Exception as e:
+        print(f"WARNING: Could not simplify AOI, using it as drawn: {e}")
+        return aoi_coords
+    if polygon.is_empty or polygon.geom_type != 'Polygon':
+        return aoi_coords
+    rings = [polygon.exterior] + list(polygon.interiors)
+    return [[list(point) for point in ring.coords] for ring in rings]
+
+# Gzip level for the streamed analysis response (long signed tile URLs compress well)
+NDJSON_GZIP_LEVEL = 6
+
+def gzip_stream(chunks, level=NDJSON_GZIP_LEVEL):
+    """Gzips a stream of byte chunks, flushing after each one so the client can decode every stage on arrival."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS) # 16 + MAX_WBITS: gzip container
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+def ndjson_response(chunks):
+    """Streams ND-JSON chunks, gzip-compressed per stage when the client accepts gzip."""
+    if request.accept_encodings['gzip'] > 0:
+        response = Response(gzip_stream(chunks), mimetype='application/x-ndjson')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(chunks, mimetype='application/x-ndjson')
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
 # Flask Routes
 @app.route('/')
 def index():
@@ -46,153 +452,156 @@ def perform_analysis_route():
     if ee is None:
         return jsonify({'error': 'Earth Engine not initialized on the server.'}), 500
 
-    data = request.get_json()
+    data = request.get_json(silent=True)
     # Expecting GeoJSON-like coordinates: [[[lon,lat],[lon,lat],...]] for a polygon
-    aoi_coords = data.get('aoi_coordinates') 
+    aoi_coords = data.get('aoi_coordinates') if isinstance(data, dict) else None
 
     if not aoi_coords:
         return jsonify({'error': 'AOI coordinates are required.'}), 400
+    if not is_valid_aoi_coords(aoi_coords):
+        return jsonify({'error': 'AOI coordinates must be a list of rings of [lon, lat] points.'}), 400
+
+    # Identical AOIs are served from the cache instead of re-running the whole GEE pipeline
+    cache_key = aoi_cache_key(aoi_coords)
+    cached_response = get_cached_analysis(cache_key)
+    if cached_response is not None:
+        print(f"DEBUG: Returning cached analysis for AOI key {cache_key}.")
+        return ndjson_response(ndjson_line(stage) for stage in cached_response)
 
     try:
         # Convert AOI coordinates to ee.Geometry.Polygon
         # It expects a list of linear rings. For a single polygon, it's a list containing one ring.
         # Example for rectangle: [[[-122.4, 37.7], [-122.5, 37.7], [-122.5, 37.8], [-122.4, 37.8], [-122.4, 37.7]]]
-        aoi = ee.Geometry.Polygon(aoi_coords)
-        print(f"DEBUG: AOI geometry created from {len(aoi_coords[0]) if aoi_coords and aoi_coords[0] else 0} points.")
-
-        # 1. Elevation Data and Classification
-        dataset = ee.Image('USGS/SRTMGL1_003')
-        elevation = dataset.select('elevation').clip(aoi)
-
-        # Re-project empty image for consistent resolution (as in GEE script)
-        # Using 30m nominal scale for consistency with WorldCover, and EPSG:4326 CRS
-        empty_image = ee.Image(0).reproject('EPSG:4326', None, 30) 
-
-        # Classify elevation: 1 for (30m < elevation < 2000m)
-        dem_class = empty_image.where(
-            (elevation.lt(2000).And(elevation.gt(30))), 1
-        )
-
-        # Calculate min/max elevation stats
-        # .getInfo() here resolves the EE Dictionary to a Python Dictionary
-        elevation_stats = elevation.reduceRegion(
-            reducer=ee.Reducer.minMax(),
-            geometry=aoi,
-            scale=500, # Use 500m scale for stats as in original GEE script
-            bestEffort=True
-        ).getInfo()
-
-        # 2. Slope Data and Classification
-        slope = ee.Terrain.slope(elevation).clip(aoi)
-        # Classify slope: 1 for <5 deg, 0.6 for 5-10 deg (and elevation < 10m), 0.4 for >10 deg
-        slope_class = empty_image.where(
-            (slope.lt(5)), 1
-        ).where(
-            (slope.gt(5).And(elevation.lt(10))), 0.6 # Original script had OR, re-checked and updated to AND for consistency with logic
-        ).where(
-            (slope.gt(10)), 0.4
-        )
-
-        # Calculate min/max/mean slope stats
-        # .getInfo() here resolves the EE Dictionary to a Python Dictionary
-        slope_stats = slope.reduceRegion(
-            reducer=ee.Reducer.minMax().combine(ee.Reducer.mean(), sharedInputs=True),
-            geometry=aoi,
-            scale=500, # Use 500m scale for stats
-            bestEffort=True
-        ).getInfo()
-
-        # 3. Land Use/Land Cover (LULC) Data and Classification
-        # Using ESA WorldCover v200, which has a 'Map' band for LULC classes
-        lulc_collection = ee.ImageCollection('ESA/WorldCover/v200')
-        lulc = lulc_collection.first().clip(aoi) # Get the first image (often the latest)
-
-        # WorldCover classes: 20=Shrubland, 60=Barren/Sparse Vegetation
-        # Classify LULC: 1 for Shrubland or Barren/Sparse Vegetation
-        class_lulc = empty_image.where(
-            (lulc.eq(20).Or(lulc.eq(60))), 1
-        )
-
-        # Suitability Overlay: Combine classifications
-        # Sum the classified layers. A value of 3 means all three criteria (DEM, Slope, LULC) are met.
-        suitability_raw = dem_class.add(slope_class).add(class_lulc)
-        
-        # Reclassify raw suitability scores into discrete suitability levels (1-4)
-        suitability = empty_image.where(suitability_raw.eq(3), 1) \
-                             .where(suitability_raw.eq(2.6), 2) \
-                             .where(suitability_raw.eq(2.4), 3) \
-                             .where(suitability_raw.lt(2.4), 4)
-
-        # Mask out areas that are not suitable (value < 1)
-        suitability = suitability.updateMask(suitability.gte(1)).clip(aoi)
+        # Non-geodesic (planar lon/lat edges): matches the polygon as drawn on the Leaflet map and the tile
+        # rectangles, and EE skips great-circle densification of every edge.
+        # The simplified outline is used for everything sent to EE or reduced (tiles, COG); the map center
+        # and bounds below still come from the AOI as drawn.
+        analysis_coords = simplify_aoi_coords(aoi_coords)
+        aoi = ee.Geometry.Polygon(analysis_coords, None, False)
+        print(f"DEBUG: AOI geometry created from {len(analysis_coords[0]) if analysis_coords and analysis_coords[0] else 0} "
+              f"points (simplified from {len(aoi_coords[0]) if aoi_coords and aoi_coords[0] else 0}).")
+
+        # 1-3. Elevation, slope and LULC classification combined into the suitability layer
+        elevation, slope, suitability = ELEVATION, SLOPE, SUITABILITY
 
         # Suitability Visualization Palette (matching GEE script)
         suitability_vis = {
-            'min': 0, 'max': 4,
-            'palette': ['#FFFFFF', '#52E929', '#F5A742', '#AB2103', '#FF0000']
+            'min': 1, 'max': 4, # Classes 1-4; the remap leaves no 0 class
+            'palette': ['#52E929', '#F5A742', '#AB2103', '#FF0000']
         }
-        # Get map tile URL for the final suitability layer to display on frontend
-        suitability_map_id = suitability.getMapId(suitability_vis)
-        suitability_tile_url = suitability_map_id['tile_fetcher'].url_format
-        print(f"DEBUG: Suitability tile URL generated: {suitability_tile_url[:70]}...")
-
-        # 4. Calculate Area for Chart
-        # Define names for suitability classes (matching frontend chart labels)
-        names = ['Most Suitable', 'Medium Suitable', 'Less Suitable', 'Not Suitable']
-        # Reclassify suitability into separate bands for each class for accurate area calculation
-        # E.g., a band 'Most Suitable' will have 1 where suitability is 1, and 0 elsewhere.
-        count = suitability.eq([1, 2, 3, 4]).rename(names)
-
-        # Calculate pixel area in square kilometers (pixelArea() returns m^2, divide by 10^6)
-        pixel_area_image = ee.Image.pixelArea().divide(1000 * 1000) # km^2
-
-        # Reduce region to get sum of areas for each suitability class
-        # .getInfo() here resolves the EE Dictionary to a Python Dictionary
-        total_area_by_class = count.multiply(pixel_area_image).reduceRegion(
-            reducer=ee.Reducer.sum(),
-            geometry=aoi,
-            scale=100, # Use 100m scale for area calculation as in GEE script
-            maxPixels=1e11, # Allow processing a large number of pixels
-            bestEffort=True
-        ).getInfo()
-
-        # Prepare data for the bar chart (list of dictionaries)
-        chart_data_features = []
-        for name in names:
-            # area_val is already a Python number from total_area_by_class.get()
-            area_val = total_area_by_class.get(name, 0) 
-            chart_data_features.append({
-                'Suitability': name,
-                # No need to call ee_number_to_float here, as area_val is already a float/int
-                'Area': round(area_val, 2) if area_val is not None else 0,
-                'Type': name 
-            })
-        print("DEBUG: Chart data generated.")
-        
-        # 5. Power Generation Calculation
-        most_suitable_area_sqkm = total_area_by_class.get('Most Suitable', 0) # Already a Python number
-        # Formula from original GEE script: Area (km^2) * 1.7 (kW/m^2) * 0.85 (efficiency) * 300 (days)
-        power_generation_mwh = (most_suitable_area_sqkm * 1.7 * 0.85 * 300) if most_suitable_area_sqkm is not None else 0
-        power_generation_mwh = round(power_generation_mwh, 3)
-        print(f"DEBUG: Power generation (MWh): {power_generation_mwh}")
-
-        # 6. Number of Solar Panels Required
-        # most_suitable_area_sqkm is already a Python number
-        num_panels = (most_suitable_area_sqkm * 1.7 * 0.85 * 1000000) if most_suitable_area_sqkm is not None else 0
-        num_panels = round(num_panels)
-        print(f"DEBUG: Number of panels: {num_panels}")
-
-        # 7. Solar Radiation Data (for display as a map layer)
-        solar_radiation = ee.ImageCollection("ECMWF/ERA5_LAND/DAILY_AGGR") \
-                            .filterDate('2024-01-01', '2024-12-31') \
-                            .mean() \
-                            .select("surface_solar_radiation_downwards_sum") \
-                            .clip(aoi)
+
+        # Solar Radiation Data (for display as a map layer)
+        solar_radiation = SOLAR_RADIATION.clip(aoi)
 
         solar_radiation_vis = {'min': 10000000, 'max': 20000000, 'palette': ['blue', 'green', 'yellow', 'red']} # Example palette
-        solar_radiation_map_id = solar_radiation.getMapId(solar_radiation_vis)
-        solar_radiation_tile_url = solar_radiation_map_id['tile_fetcher'].url_format
-        print(f"DEBUG: Solar radiation tile URL generated: {solar_radiation_tile_url[:70]}...")
+
+        # The tile URLs only depend on the AOI geometry, so request them first; they are collected while
+        # streaming the response below. These calls are network-bound, so threads are sufficient.
+        suitability_future = map_id_executor.submit(suitability.clip(aoi).getMapId, suitability_vis)
+        solar_radiation_future = map_id_executor.submit(solar_radiation.getMapId, solar_radiation_vis)
+
+        names = SUITABILITY_CLASS_NAMES
+
+        def resolve_statistics():
+            """Builds and resolves the batched statistics. Runs on the stats pool because the COG read and the
+               tile split are local work that would otherwise hold up the request thread."""
+            # Calculate min/max/mean elevation and slope stats in one reducer pass over a stacked image
+            # (outputs elevation_min/max/mean and slope_min/max/mean)
+            # Left unresolved here; fetched together with the other results in the single .getInfo() at the end
+            terrain_stats_ee = elevation.addBands(slope).reduceRegion(
+                reducer=TERRAIN_STATS_REDUCER,
+                geometry=aoi,
+                scale=500, # Use 500m scale for stats as in original GEE script
+                maxPixels=REDUCER_MAX_PIXELS,
+                tileScale=REDUCER_TILE_SCALE
+            )
+
+            # 4. Calculate Area for Chart
+            # Reclassify suitability into separate bands for each class for accurate area calculation
+            # E.g., a band 'Most Suitable' will have 1 where suitability is 1, and 0 elsewhere.
+            count = suitability.eq([1, 2, 3, 4]).rename(names)
+
+            # Calculate pixel area in square kilometers (pixelArea() returns m^2, divide by 10^6)
+            pixel_area_image = PIXEL_AREA_KM2 # km^2
+
+            area_image = count.multiply(pixel_area_image)
+
+            # AOIs inside the precomputed suitability COG are summed locally without any EE reduction
+            cog_areas = cog_class_areas(analysis_coords)
+            if cog_areas is not None:
+                print("DEBUG: Class areas computed from the precomputed suitability COG.")
+                precomputed_areas = [cog_areas]
+                missing_tiles = {}
+                total_area_by_class_ee = ee.Dictionary({})
+            else:
+                # Split the AOI into map tiles lying entirely inside it (cached across requests) and the
+                # remaining area along the AOI boundary, which is always reduced for this request.
+                inside_tiles = tiles_inside_aoi(analysis_coords)
+                cached_tile_areas = get_cached_tile_areas(inside_tiles)
+                missing_tiles = {key: b for key, b in inside_tiles.items() if key not in cached_tile_areas}
+                print(f"DEBUG: {len(inside_tiles)} tiles inside AOI, {len(cached_tile_areas)} served from tile cache.")
+
+                if inside_tiles:
+                    tiles_geometry = ee.Geometry.MultiPolygon(
+                        [[[[w, s], [e, s], [e, n], [w, n], [w, s]]] for w, s, e, n in inside_tiles.values()],
+                        geodesic=False
+                    )
+                    residual_geometry = aoi.difference(tiles_geometry, 1)
+                else:
+                    residual_geometry = aoi
+                precomputed_areas = list(cached_tile_areas.values())
+
+                # Reduce region to get sum of areas for each suitability class outside the cached tiles
+                # Left unresolved here; fetched together with the other results in the single .getInfo() at the end
+                total_area_by_class_ee = area_image.reduceRegion(
+                    reducer=AREA_SUM_REDUCER,
+                    geometry=residual_geometry,
+                    scale=100, # Use 100m scale for area calculation as in GEE script
+                    maxPixels=REDUCER_MAX_PIXELS,
+                    tileScale=REDUCER_TILE_SCALE
+                )
+
+            # One reduceRegion per uncached tile, fanned out server-side so they resolve in the same round-trip
+            if missing_tiles:
+                missing_tiles_fc = ee.FeatureCollection([
+                    ee.Feature(ee.Geometry.Rectangle([w, s, e, n], geodesic=False), {'tile_key': key})
+                    for key, (w, s, e, n) in missing_tiles.items()
+                ])
+                tile_areas_fc = missing_tiles_fc.map(lambda tile: tile.set(area_image.reduceRegion(
+                    reducer=AREA_SUM_REDUCER,
+                    geometry=tile.geometry(),
+                    scale=100,
+                    maxPixels=REDUCER_MAX_PIXELS,
+                    tileScale=REDUCER_TILE_SCALE
+                )))
+                tile_areas_ee = tile_areas_fc.reduceColumns(ee.Reducer.toList(len(names) + 1), ['tile_key'] + names).get('list')
+                missing_most_suitable_ee = tile_areas_fc.aggregate_sum('Most Suitable')
+            else:
+                tile_areas_ee = ee.List([])
+                missing_most_suitable_ee = ee.Number(0)
+
+            # 5. Power Generation and 6. Number of Solar Panels, evaluated server-side in the same batch
+            # Most suitable area = boundary strip + newly reduced tiles + tiles already in the cache (or the COG)
+            cached_most_suitable = sum(areas.get('Most Suitable') or 0 for areas in precomputed_areas)
+            most_suitable_area_ee = ee.Number(total_area_by_class_ee.get('Most Suitable', 0)) \
+                                      .add(missing_most_suitable_ee) \
+                                      .add(cached_most_suitable)
+            # Formula from original GEE script: Area (km^2) * 1.7 (kW/m^2) * 0.85 (efficiency) * 300 (days)
+            power_generation_ee = most_suitable_area_ee.multiply(1.7 * 0.85 * 300)
+            num_panels_ee = most_suitable_area_ee.multiply(1.7 * 0.85 * 1000000).round()
+
+            # Resolve all statistics in one server round-trip instead of one .getInfo() per result.
+            # The values are still unresolved EE objects here; the wrapper dictionary is evaluated once.
+            batched_results = ee.Dictionary({
+                'terrain': terrain_stats_ee,
+                'areas': total_area_by_class_ee,
+                'tiles': tile_areas_ee,
+                'power': power_generation_ee,
+                'panels': num_panels_ee
+            }).getInfo()
+            return batched_results, precomputed_areas
+
+        stats_future = stats_executor.submit(resolve_statistics)
 
         # 8. Download link for the suitable areas as KML (Removed as per user request)
         # The following code block was removed:
@@ -213,59 +622,15 @@ def perform_analysis_route():
         # )
         # print(f"DEBUG: KML download URL generated: {kml_url[:70]}...")
         
-        # 9. Determine map center and zoom level for the AOI
-        # .getInfo() here resolves the EE List to a Python List
-        center = aoi.centroid().coordinates().getInfo() # Returns [lon, lat]
-        map_center = [center[1], center[0]] # Convert to [lat, lon] for Leaflet
-
-        # Calculate a rough zoom level based on the AOI's bounding box extent
-        # .getInfo() here resolves the EE Dictionary to a Python Dictionary
-        bounds_geojson = aoi.bounds().getInfo()
-        map_zoom = 10 # Default zoom if bounds are problematic
-
-        if 'coordinates' in bounds_geojson and len(bounds_geojson['coordinates']) > 0:
-            # For a simple polygon/rectangle, coordinates will be a list of rings.
-            # We need to flatten and find min/max lon/lat
-            lons = [p[0] for ring in bounds_geojson['coordinates'] for p in ring]
-            lats = [p[1] for ring in bounds_geojson['coordinates'] for p in ring]
-            
-            if lons and lats: # Ensure lists are not empty
-                min_lon = min(lons)
-                max_lon = max(lons)
-                min_lat = min(lats)
-                max_lat = max(lats)
-
-                delta_lon = max_lon - min_lon
-                delta_lat = max_lat - min_lat
-
-                # Heuristic for zoom level based on geographic extent
-                # This is an approximation; Leaflet's fitBounds on the client is more precise.
-                if delta_lon > 0 and delta_lat > 0:
-                    zoom_lon = math.log2(360 / delta_lon) if delta_lon > 0 else 0
-                    zoom_lat = math.log2(180 / delta_lat) if delta_lat > 0 else 0
-                    # Take the smaller zoom to ensure the entire AOI fits
-                    map_zoom = max(1, min(math.floor(min(zoom_lon, zoom_lat)) + 1, 16)) # Clamp zoom to 1-16
-                else:
-                    map_zoom = 10 # Default for very small or point-like areas
-        print(f"DEBUG: Calculated map center: {map_center}, zoom: {map_zoom}")
-
-        # Return all computed results to the frontend
-        return jsonify({
-            'status': 'success',
-            'suitability_tile_url': suitability_tile_url,
-            'solar_radiation_tile_url': solar_radiation_tile_url,
-            'chart_data': chart_data_features,
-            # These values are already Python floats from elevation_stats and slope_stats dictionaries
-            'elevation_min': elevation_stats.get('elevation_min'),
-            'elevation_max': elevation_stats.get('elevation_max'),
-            'slope_min': slope_stats.get('slope_min'),
-            'slope_max': slope_stats.get('slope_max'),
-            'power_generation_mwh': power_generation_mwh,
-            'num_panels': num_panels,
-            # Removed 'kml_download_url' from the response as it's no longer generated
-            'map_center': map_center,
-            'map_zoom': map_zoom
-        })
+        # 9. Determine map center and bounds for the AOI
+        # Both come straight from the client-supplied outer ring, so no Earth Engine round-trip is needed
+        center_lon, center_lat = aoi_centroid(aoi_coords)
+        map_center = [center_lat, center_lon] # [lat, lon] for Leaflet
+
+        # Leaflet's fitBounds picks the zoom from the bounding box
+        min_lon, min_lat, max_lon, max_lat = aoi_bbox(aoi_coords)
+        map_bounds = [[min_lat, min_lon], [max_lat, max_lon]] # [[south, west], [north, east]] for Leaflet
+        print(f"DEBUG: Calculated map center: {map_center}, bounds: {map_bounds}")
 
     except Exception as e:
         import traceback
@@ -273,6 +638,82 @@ def perform_analysis_route():
         traceback.print_exc() # Print full traceback for server-side debugging
         return jsonify({'error': f'Failed to perform analysis: {e}'}), 500
 
+    def generate_stages():
+        """Yields the 'tiles' stage as soon as both tile URLs are ready, then the heavier 'stats' stage."""
+        try:
+            # Get map tile URLs for the final suitability layer and the solar radiation layer
+            suitability_tile_url = suitability_future.result()['tile_fetcher'].url_format
+            print(f"DEBUG: Suitability tile URL generated: {suitability_tile_url[:70]}...")
+            solar_radiation_tile_url = solar_radiation_future.result()['tile_fetcher'].url_format
+            print(f"DEBUG: Solar radiation tile URL generated: {solar_radiation_tile_url[:70]}...")
+
+            tiles_stage = {
+                'stage': 'tiles',
+                'status': 'success',
+                'suitability_tile_url': suitability_tile_url,
+                'solar_radiation_tile_url': solar_radiation_tile_url,
+                'map_center': map_center,
+                'map_bounds': map_bounds
+            }
+            yield ndjson_line(tiles_stage)
+
+            batched_results, precomputed_areas = stats_future.result()
+            terrain_stats = batched_results['terrain']
+            print("DEBUG: Batched statistics resolved with a single getInfo() call.")
+
+            # Cache the newly computed tiles, then add all inside-tile areas to the boundary area
+            new_tile_areas = {row[0]: dict(zip(names, row[1:])) for row in batched_results['tiles']}
+            cache_tile_areas(new_tile_areas)
+            total_area_by_class = {name: batched_results['areas'].get(name) or 0 for name in names}
+            for tile_areas in precomputed_areas + list(new_tile_areas.values()):
+                for name in names:
+                    total_area_by_class[name] += tile_areas.get(name) or 0
+
+            # Prepare data for the bar chart (list of dictionaries)
+            chart_data_features = []
+            for name in names:
+                # area_val is already a Python number from total_area_by_class.get()
+                area_val = total_area_by_class.get(name, 0) 
+                chart_data_features.append({
+                    'Suitability': name,
+                    # No need to call ee_number_to_float here, as area_val is already a float/int
+                    'Area': round(area_val, 2) if area_val is not None else 0,
+                    'Type': name 
+                })
+            print("DEBUG: Chart data generated.")
+
+            # Power generation and panel count were already computed server-side in the batched .getInfo()
+            power_generation_mwh = round(batched_results['power'] or 0, 3)
+            print(f"DEBUG: Power generation (MWh): {power_generation_mwh}")
+            num_panels = int(batched_results['panels'] or 0)
+            print(f"DEBUG: Number of panels: {num_panels}")
+
+            stats_stage = {
+                'stage': 'stats',
+                'status': 'success',
+                'chart_data': chart_data_features,
+                # These values are already Python floats from the terrain_stats dictionary
+                'elevation_min': terrain_stats.get('elevation_min'),
+                'elevation_max': terrain_stats.get('elevation_max'),
+                'slope_min': terrain_stats.get('slope_min'),
+                'slope_max': terrain_stats.get('slope_max'),
+                'power_generation_mwh': power_generation_mwh,
+                'num_panels': num_panels
+                # Removed 'kml_download_url' from the response as it's no longer generated
+            }
+            cache_analysis(cache_key, [tiles_stage, stats_stage])
+            yield ndjson_line(stats_stage)
+
+        except Exception as e:
+            import traceback
+            print(f"ERROR during analysis in /perform_analysis: {e}")
+            traceback.print_exc() # Print full traceback for server-side debugging
+            # Headers are already sent, so errors are reported as a final stage instead of an HTTP status
+            yield ndjson_line({'stage': 'error', 'status': 'error', 'error': f'Failed to perform analysis: {e}'})
+
+    # Stream results as newline-delimited JSON: tile URLs first, statistics once the batched getInfo() resolves
+    return ndjson_response(generate_stages())
+
 # Entry point for the Flask application
 if __name__ == '__main__':
     # Run in debug mode during development for auto-reloading and detailed errors.
@@ -214,23 +214,13 @@ function initializeChart(chartData) {
 
 
 // --- Functions to update UI elements with analysis results ---
-function updateAnalysisResults(data) {
-    console.log("updateAnalysisResults() called with data:", data);
+// Called with the 'tiles' stage of the streamed response (tile URLs and AOI bounds arrive first)
+function updateMapLayers(data) {
+    console.log("updateMapLayers() called with data:", data);
     // Show the results panel content
     resultsPanelContent.style.display = 'block';
-
-    // Update observation text fields
-    elevationRangeOutput.textContent = `Elevation Range in Meters: ${data.elevation_min.toFixed(0)} - ${data.elevation_max.toFixed(0)}`;
-    slopeRangeOutput.textContent = `Slope Range in Degrees: ${data.slope_min.toFixed(2)} - ${data.slope_max.toFixed(2)}`;
-    powerGenerationOutput.textContent = `Most Suitable area Power Generation (MWh): ${data.power_generation_mwh.toFixed(3)}`;
-    numPanelsOutput.textContent = `Number of Solar Panels Required: ${data.num_panels.toFixed(0)}`;
-
-    // Update and display the chart
-    initializeChart(data.chart_data);
-    chartStatus.textContent = 'Chart updated with analysis results.';
-    chartStatus.style.color = 'green';
-
-
+    chartStatus.textContent = 'Calculating area statistics...';
+    chartStatus.style.color = '#666';
 
     // Add Suitability Map layer to Leaflet
     if (suitabilityTileLayer) {
@@ -250,16 +240,35 @@ function updateAnalysisResults(data) {
     toggleSolarLayer.checked = false; // Ensure its checkbox is unchecked initially
     console.log("Solar radiation layer prepared.");
 
-    // Set map view to the analyzed AOI's center and zoom
-    if (data.map_center && data.map_zoom) {
-        map.setView(data.map_center, data.map_zoom);
-        console.log(`Map view set to center: ${data.map_center}, zoom: ${data.map_zoom}`);
+    // Fit map view to the analyzed AOI's bounding box ([[south, west], [north, east]])
+    // maxZoom keeps very small AOIs from zooming past level 16, matching the old server-side clamp
+    if (data.map_bounds) {
+        map.fitBounds(L.latLngBounds(data.map_bounds), { maxZoom: 16 });
+        console.log(`Map view fitted to bounds: ${JSON.stringify(data.map_bounds)}`);
     }
     // Invalidate map size to ensure it renders correctly after panel visibility changes
     map.invalidateSize(); 
     console.log("Map invalidateSize called.");
 }
 
+// Called with the 'stats' stage of the streamed response (observations and chart data)
+function updateAnalysisResults(data) {
+    console.log("updateAnalysisResults() called with data:", data);
+    // Show the results panel content
+    resultsPanelContent.style.display = 'block';
+
+    // Update observation text fields
+    elevationRangeOutput.textContent = `Elevation Range in Meters: ${data.elevation_min.toFixed(0)} - ${data.elevation_max.toFixed(0)}`;
+    slopeRangeOutput.textContent = `Slope Range in Degrees: ${data.slope_min.toFixed(2)} - ${data.slope_max.toFixed(2)}`;
+    powerGenerationOutput.textContent = `Most Suitable area Power Generation (MWh): ${data.power_generation_mwh.toFixed(3)}`;
+    numPanelsOutput.textContent = `Number of Solar Panels Required: ${data.num_panels.toFixed(0)}`;
+
+    // Update and display the chart
+    initializeChart(data.chart_data);
+    chartStatus.textContent = 'Chart updated with analysis results.';
+    chartStatus.style.color = 'green';
+}
+
 // --- Function to reset all analysis results and map state ---
 function resetAnalysisResults() {
     console.log("resetAnalysisResults() called.");
@@ -438,22 +447,55 @@ function sendAnalysisRequest(aoiCoordinates) {
                 throw new Error(errorMessage); // Throw an error to be caught by the .catch block
             });
         }
-        return response.json(); // Parse JSON response if OK
-    })
-    .then(data => {
-        if (data.status === 'success') {
-            console.log("Analysis successful. Data:", data);
-            updateAnalysisResults(data); // Update frontend UI with results
-            instructions.textContent = 'Analysis complete!';
-        } else {
-            // This block handles custom error messages from your Flask app if status is not 'success'
-            alert('Analysis failed: ' + data.error);
-            instructions.textContent = 'Analysis failed. Check console for details.';
-            console.error('Analysis error from server (status not success):', data.error);
+        // The response is newline-delimited JSON: a 'tiles' stage first, then a 'stats' stage.
+        // Read it incrementally so the map layers show up before the statistics are ready.
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let statsReceived = false;
+
+        function handleStage(line) {
+            if (!line.trim()) {
+                return;
+            }
+            const data = JSON.parse(line);
+            if (data.stage === 'tiles') {
+                console.log("Tile stage received. Data:", data);
+                updateMapLayers(data); // Show map layers immediately
+                instructions.textContent = 'Map layers ready. Calculating statistics...';
+            } else if (data.stage === 'stats') {
+                console.log("Analysis successful. Data:", data);
+                statsReceived = true;
+                updateAnalysisResults(data); // Update frontend UI with results
+                instructions.textContent = 'Analysis complete!';
+            } else {
+                // This block handles custom error messages from your Flask app if status is not 'success'
+                console.error('Analysis error from server (status not success):', data.error);
+                throw new Error(data.error || 'Analysis failed');
+            }
+        }
+
+        function readChunk() {
+            return reader.read().then(({ done, value }) => {
+                buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+                const lines = buffer.split('\n');
+                buffer = lines.pop(); // Keep any incomplete trailing line for the next chunk
+                lines.forEach(handleStage);
+                if (done) {
+                    handleStage(buffer);
+                    if (!statsReceived) {
+                        // The connection dropped (or the worker died) after the tiles stage
+                        throw new Error('Analysis stream ended before statistics were received');
+                    }
+                    return;
+                }
+                return readChunk();
+            });
         }
+        return readChunk();
     })
     .catch((error) => {
-        // Catch any errors during fetch or in the .then blocks
+        // Catch any errors during fetch, while reading the stream, or from an error stage
         console.error('Fetch error:', error);
         alert('An error occurred during the analysis request: ' + error.message);
         instructions.textContent = 'Error during analysis. Check console.';